@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tqdm import tqdm
+
+import merge_knowledge as mk
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Начало markdown-заголовка: "# ...", "## ..." и т.д.
+_HEADING_RE = re.compile(r"^#{1,6}\s", re.MULTILINE)
+
+# Разделители от крупных к мелким: абзац, строка, предложение, слово
+_SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+# Версия алгоритма разбиения, входит в ключ кэша: при ее смене кэш сбрасывается
+_SPLITTER_VERSION = 2
+
+
+def _split_sections(text: str) -> list[str]:
+    """Разбивает текст на секции, каждая начинается со своего заголовка"""
+    starts = [m.start() for m in _HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    bounds = starts + [len(text)]
+    sections = [text[bounds[i] : bounds[i + 1]] for i in range(len(starts))]
+    return [s for s in sections if s.strip()]
+
+
+def _split_pieces(text: str, chunk_size: int, separators: list[str]) -> list[str]:
+    """
+    Рекурсивно режет текст на куски не длиннее chunk_size,
+    сохраняя разделители на концах кусков
+    """
+    if len(text) <= chunk_size:
+        return [text]
+
+    if not separators:
+        return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    sep, rest = separators[0], separators[1:]
+    parts = text.split(sep)
+    pieces = []
+    for i, part in enumerate(parts):
+        if i < len(parts) - 1:
+            part += sep
+        if not part:
+            continue
+        pieces.extend(_split_pieces(part, chunk_size, rest))
+
+    return pieces
+
+
+def _merge_pieces(pieces: list[str], chunk_size: int, chunk_overlap: int) -> list[str]:
+    chunks = []
+    current: list[str] = []
+    current_len = 0
+
+    for piece in pieces:
+        if current and current_len + len(piece) > chunk_size:
+            chunks.append("".join(current))
+
+            # Оставляем хвост предыдущего чанка в качестве перекрытия
+            while current and (
+                current_len > chunk_overlap or current_len + len(piece) > chunk_size
+            ):
+                current_len -= len(current.pop(0))
+
+        current.append(piece)
+        current_len += len(piece)
+
+    if current:
+        chunks.append("".join(current))
+
+    return chunks
+
+
+def _split_section(section: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    if len(section) <= chunk_size:
+        return [section]
+
+    heading, body = "", section
+    if _HEADING_RE.match(section):
+        heading, _, body = section.partition("\n")
+        heading = heading.strip()
+
+    # Заголовок повторяем в начале каждого чанка секции, чтобы чанк
+    # не терял контекст. Слишком длинный заголовок режем вместе с текстом
+    if heading and len(heading) + 1 <= chunk_size // 2:
+        body_size = chunk_size - len(heading) - 1
+        pieces = _split_pieces(body, body_size, _SEPARATORS)
+        return [
+            f"{heading}\n{chunk.strip()}"
+            for chunk in _merge_pieces(pieces, body_size, chunk_overlap)
+            if chunk.strip()
+        ]
+
+    pieces = _split_pieces(section, chunk_size, _SEPARATORS)
+    return _merge_pieces(pieces, chunk_size, chunk_overlap)
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    """
+    Разбивает markdown или текст поста ВК на чанки длиной до chunk_size символов.
+    Чанки не пересекают границы секций (заголовков) и по возможности режутся
+    по абзацам; соседние чанки секции перекрываются до chunk_overlap символов.
+    Если секция не помещается в один чанк, ее заголовок повторяется в каждом.
+    """
+    chunks = []
+    for section in _split_sections(text):
+        for chunk in _split_section(section, chunk_size, chunk_overlap):
+            chunk = chunk.strip()
+            if chunk:
+                chunks.append(chunk)
+
+    return chunks
+
+
+def get_cache_key(item: dict, chunk_size: int, chunk_overlap: int) -> str:
+    """Ключ кэша: хэш content вместе с параметрами и версией разбиения"""
+    key = (
+        f"{mk.content_hash(item)}:{chunk_size}:{chunk_overlap}:{_SPLITTER_VERSION}"
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _get_chunk_id(url: str, cache_key: str, chunk_index: int) -> str:
+    key = f"{url}\n{cache_key}\n{chunk_index}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _load_cache(cache_file: Path) -> dict[str, list[str]]:
+    if not cache_file.exists():
+        return {}
+
+    try:
+        with cache_file.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        logger.info(f"⚠️ Кэш чанков {cache_file} поврежден, строим заново")
+        return {}
+
+
+def _save_cache(cache: dict[str, list[str]], cache_file: Path) -> None:
+    # Кэш хранится в .json, чтобы его не удаляла очистка *.jsonl перед сбором
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    with tmp_file.open("w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    tmp_file.replace(cache_file)
+
+
+def _split_task(args: tuple[str, int, int]) -> list[str]:
+    return split_text(*args)
+
+
+def process(
+    input_file: Path,
+    output_file: Path,
+    cache_file: Path,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    workers: int | None = None,
+):
+    if chunk_size <= 0:
+        raise ValueError("❌ CHUNK_SIZE должен быть больше 0")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("❌ CHUNK_OVERLAP должен быть от 0 до CHUNK_SIZE (не включая)")
+
+    old_cache = _load_cache(cache_file)
+    logger.info(f"Загружено {len(old_cache)} записей из кэша чанков {cache_file}")
+
+    items = []
+    with open(input_file, "r", encoding="utf-8") as f_in:
+        for line in f_in:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    keys = [get_cache_key(item, chunk_size, chunk_overlap) for item in items]
+
+    # В новый кэш попадают только ключи текущего снапшота
+    cache = {key: old_cache[key] for key in keys if key in old_cache}
+    missing = {}
+    for item, key in zip(items, keys):
+        if key not in cache:
+            missing[key] = item.get("content") or ""
+
+    logger.info(
+        f"Чанков из кэша: {len(cache)}, требуется разбить записей: {len(missing)}"
+    )
+
+    if missing:
+        tasks = [(content, chunk_size, chunk_overlap) for content in missing.values()]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            results = executor.map(_split_task, tasks, chunksize=64)
+            for key, chunks in tqdm(
+                zip(missing.keys(), results), total=len(tasks), desc="Разбиение на чанки"
+            ):
+                cache[key] = chunks
+
+    chunks_count = 0
+    with open(output_file, "w", encoding="utf-8") as f_out:
+        for item, key in zip(items, keys):
+            for i, chunk in enumerate(cache[key]):
+                out_chunk = {
+                    "chunk_id": _get_chunk_id(item["url"], key, i),
+                    "url": item["url"],
+                    "name": item.get("name"),
+                    "chunk_index": i,
+                    "content": chunk,
+                    "date": item.get("date"),
+                    "collection_date": item.get("collection_date"),
+                }
+                f_out.write(json.dumps(out_chunk, ensure_ascii=False) + "\n")
+                chunks_count += 1
+
+    _save_cache(cache, cache_file)
+    # У одного url много чанков, поэтому индексируем по chunk_id
+    mk.build_index(output_file, key_field="chunk_id")
+    logger.info(f"✅ Записано {chunks_count} чанков из {len(items)} записей в {output_file}")
+
+
+def main():
+    BASE = Path(__file__).resolve().parent
+    SCRAPPED_DATA_DIR = BASE.joinpath("scrapped_data")
+    INPUT = SCRAPPED_DATA_DIR.joinpath("filtered_merged_latest_knowledge.jsonl")
+    OUTPUT = SCRAPPED_DATA_DIR.joinpath("chunks.jsonl")
+    CACHE = SCRAPPED_DATA_DIR.joinpath("cache", "chunks_cache.json")
+
+    process(INPUT, OUTPUT, CACHE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import json
+import os
+import threading
+import time
+import datetime
+from pathlib import Path
+from typing import Optional
+import requests
+import vk_api
+from vk_api.vk_api import VkApiMethod
+from dotenv import load_dotenv
+
+from crawlers import crawl_nsu_vk_knowledge as cvk
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# События Bots Long Poll, которые нас интересуют
+_WALL_EVENTS = ("wall_post_new", "wall_post_edit")
+
+
+class _LongPollError(Exception):
+    """Сервер Long Poll вернул ошибку, после которой нужно переподключиться"""
+
+
+class _LiveWriter:
+    """
+    Потокобезопасная дозапись постов в файл текущего дня
+    (vklive_scrapped_<YYYY-MM-DD>.jsonl). Правка поста дописывается
+    новой строкой с тем же url: актуальной считается последняя запись.
+
+    Дата самого нового сохраненного поста каждой группы хранится
+    в vklive_state.json, чтобы после перезапуска догрузить пропущенное.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.state_path = output_dir.joinpath("vklive_state.json")
+        self._lock = threading.Lock()
+        self._state = self._load_state()
+
+    def _load_state(self) -> dict[str, int]:
+        if not self.state_path.exists():
+            return {}
+
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.info(f"⚠️ Файл состояния {self.state_path} поврежден")
+            return {}
+
+    def _save_state(self) -> None:
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        tmp_path.replace(self.state_path)
+
+    def get_path(self) -> Path:
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        return self.output_dir.joinpath(f"vklive_scrapped_{current_date}.jsonl")
+
+    def write(self, post: dict, name: str) -> None:
+        out_post = cvk._to_output_dict(post, name)
+        json_line = json.dumps(out_post, ensure_ascii=False)
+        with self._lock:
+            with open(self.get_path(), "a", encoding="utf-8") as f_out:
+                f_out.write(json_line + "\n")
+
+            owner_id = str(post["owner_id"])
+            post_date = post.get("date")
+            if post_date is not None and post_date > self._state.get(owner_id, 0):
+                self._state[owner_id] = post_date
+                self._save_state()
+
+    def get_last_date(self, owner_id: int) -> Optional[int]:
+        """
+        Дата самого нового сохраненного поста группы. Если группы еще нет
+        в файле состояния, ищем ее посты в снапшотах vk_scrapped/vklive_scrapped.
+        """
+        with self._lock:
+            if str(owner_id) in self._state:
+                return self._state[str(owner_id)]
+
+        prefix = f"https://vk.com/wall{owner_id}_"
+        last_date = None
+        for pattern in ("vk_scrapped_*.jsonl", "vklive_scrapped_*.jsonl"):
+            for path in self.output_dir.glob(pattern):
+                with open(path, "r", encoding="utf-8") as f_in:
+                    for line in f_in:
+                        try:
+                            item = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if not item["url"].startswith(prefix) or item["date"] is None:
+                            continue
+                        if last_date is None or item["date"] > last_date:
+                            last_date = item["date"]
+
+        return last_date
+
+
+def _is_owner_post(post: dict) -> bool:
+    """
+    Как и wall.get(filter="owner") в crawl_nsu_vk_knowledge, берем только
+    опубликованные посты от имени сообщества: без предложенных записей
+    и постов пользователей на стене.
+    """
+    return post.get("post_type") == "post" and post.get("from_id") == post.get(
+        "owner_id"
+    )
+
+
+def _get_group_id(vk: VkApiMethod, domain: Optional[str] = None) -> int:
+    """
+    id группы по domain. Без domain с ключом сообщества возвращает id
+    сообщества, которому выдан ключ.
+    """
+    if domain is None:
+        response = vk.groups.getById()
+    else:
+        response = vk.groups.getById(group_id=domain)
+    # Начиная с версии API 5.194 ответ обернут в {"groups": [...]}
+    groups = response["groups"] if isinstance(response, dict) else response
+    return groups[0]["id"]
+
+
+def _get_long_poll_server(vk: VkApiMethod, group_id: int) -> dict:
+    return vk.groups.getLongPollServer(group_id=group_id)
+
+
+def _check_events(
+    http: requests.Session, server: dict, ts: str, wait: int
+) -> tuple[str, Optional[list[dict]]]:
+    """
+    Один запрос к серверу Long Poll. Возвращает (новый ts, события),
+    события равны None, если сервер сообщил о потере части истории.
+    """
+    response = http.get(
+        server["server"],
+        params={"act": "a_check", "key": server["key"], "ts": ts, "wait": wait},
+        timeout=wait + 10,
+    )
+    response.raise_for_status()
+    data = response.json()
+
+    if "failed" in data:
+        # failed=1: история событий частично потеряна, но ts можно продолжать
+        if data["failed"] == 1:
+            return data["ts"], None
+        # failed=2/3: истек ключ или потеряна информация, нужен новый сервер
+        raise _LongPollError(f"Требуется переподключение (failed={data['failed']})")
+
+    return data["ts"], data.get("updates", [])
+
+
+def _fill_gap(
+    vk: VkApiMethod,
+    domain: str,
+    title: str,
+    writer: _LiveWriter,
+    since_date: int,
+    batch_size: int = 100,
+) -> Optional[int]:
+    """
+    Догружает через wall.get посты новее since_date, пропущенные за время
+    разрыва соединения или остановки. Возвращает дату самого нового
+    сохраненного поста.
+    """
+    offset = 0
+    new_posts = []
+    while True:
+        posts = cvk._get_posts(vk, domain, count=batch_size, offset=offset)
+        if not posts:
+            break
+
+        should_stop = False
+        for post in posts:
+            is_pinned = post.get("is_pinned", 0) == 1
+            if post["date"] <= since_date:
+                # Закрепленный пост может быть старым, на нем не останавливаемся
+                if not is_pinned:
+                    should_stop = True
+                    break
+                continue
+
+            new_posts.append(post)
+
+        if should_stop:
+            break
+
+        offset += len(posts)
+        time.sleep(0.3)
+
+    # Пишем от старых к новым: если процесс упадет посреди записи,
+    # в состоянии не окажется даты новее, чем у пропущенных постов
+    new_posts.sort(key=lambda post: post["date"])
+    for post in new_posts:
+        writer.write(post, title)
+
+    if not new_posts:
+        return None
+    return new_posts[-1]["date"]
+
+
+def _stream_group(
+    vk: VkApiMethod,
+    vk_group: VkApiMethod,
+    domain: str,
+    title: str,
+    writer: _LiveWriter,
+    stop_event: threading.Event,
+    wait: int = 25,
+    reconnect_delay: float = 5.0,
+):
+    """
+    vk (сервисный ключ) используется для wall.get, vk_group (ключ сообщества) -
+    для подключения к Bots Long Poll.
+    """
+    group_id = None
+    last_date = None
+    need_gap_fill = False
+    server = None
+    ts = None
+
+    # requests.Session не потокобезопасна, поэтому у каждой группы своя
+    http = requests.Session()
+
+    while not stop_event.is_set():
+        try:
+            # id группы получаем внутри цикла, чтобы при ошибке сети повторить
+            if group_id is None:
+                resolved_id = _get_group_id(vk, domain)
+
+                # Bots Long Poll доступен только сообществу, которому выдан ключ
+                token_group_id = _get_group_id(vk_group)
+                if token_group_id != resolved_id:
+                    logger.info(
+                        f"❌ VK_GROUP_TOKEN выдан другому сообществу "
+                        f"(id={token_group_id}), получение постов группы "
+                        f"{title} (id={resolved_id}) остановлено"
+                    )
+                    return
+
+                group_id = resolved_id
+                # При запуске догружаем все, что вышло после последнего
+                # сохраненного поста. Если постов группы еще нет нигде,
+                # собираем начиная с момента запуска
+                last_date = writer.get_last_date(-group_id)
+                need_gap_fill = last_date is not None
+                if last_date is None:
+                    last_date = int(time.time())
+                logger.info(
+                    f"Подписка на новые посты группы {title} (id={group_id})..."
+                )
+
+            if server is None:
+                server = _get_long_poll_server(vk_group, group_id)
+                ts = server["ts"]
+
+            if need_gap_fill:
+                filled_date = _fill_gap(vk, domain, title, writer, last_date)
+                if filled_date is not None:
+                    logger.info(f"Догружены пропущенные посты группы {title}")
+                    last_date = max(last_date, filled_date)
+                need_gap_fill = False
+
+            ts, updates = _check_events(http, server, ts, wait)
+            if updates is None:
+                logger.info(f"⚠️ Часть событий Long Poll потеряна ({title})")
+                need_gap_fill = True
+                continue
+
+            for update in updates:
+                if update.get("type") not in _WALL_EVENTS:
+                    continue
+
+                post = update["object"]
+                if not _is_owner_post(post):
+                    continue
+
+                writer.write(post, title)
+                last_date = max(last_date, post.get("date", 0))
+                post_url = f"https://vk.com/wall{post['owner_id']}_{post['id']}"
+                logger.info(f"{update['type']}: {post_url}")
+
+        except (
+            _LongPollError,
+            requests.RequestException,
+            vk_api.exceptions.VkApiError,
+        ) as e:
+            logger.info(f"⚠️ Разрыв Long Poll ({title}): {e}")
+            server = None
+            need_gap_fill = group_id is not None
+            stop_event.wait(reconnect_delay)
+        except Exception as e:
+            # Любая другая ошибка (например, некорректный ответ сервера)
+            # не должна завершать поток группы: переподключаемся
+            logger.info(f"⚠️ Ошибка ({title}): {e!r}")
+            server = None
+            need_gap_fill = group_id is not None
+            stop_event.wait(reconnect_delay)
+
+
+def stream_vk_groups(
+    vk: VkApiMethod,
+    vk_group: VkApiMethod,
+    groups_dict: dict,
+    output_dir: Path,
+    wait: int = 25,
+    stop_event: Optional[threading.Event] = None,
+    reconnect_delay: float = 5.0,
+):
+    """
+    Запускает получение постов для каждой группы из groups_dict в отдельном
+    потоке и ждет их завершения (по stop_event или Ctrl+C).
+    vk (сервисный ключ) используется для wall.get, vk_group (ключ сообщества) -
+    для подключения к Bots Long Poll.
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+
+    writer = _LiveWriter(output_dir)
+    threads = []
+    for title, link in groups_dict.items():
+        domain = cvk._get_group_domain(link)
+        thread = threading.Thread(
+            target=_stream_group,
+            args=(vk, vk_group, domain, title, writer, stop_event),
+            kwargs={"wait": wait, "reconnect_delay": reconnect_delay},
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        logger.info("Остановка получения постов...")
+        stop_event.set()
+
+
+def stream_vk_knowledge(
+    vk_token: str,
+    vk_group_token: str,
+    urls_filepath: Path,
+    output_dir: Path,
+    wait: int = 25,
+    stop_event: Optional[threading.Event] = None,
+):
+    """
+    Долгоживущий режим: получает wall_post_new/wall_post_edit через Bots Long Poll
+    для групп из urls_filepath и дописывает их в vklive_scrapped_<date>.jsonl.
+    После разрыва соединения пропущенные посты догружаются через wall.get.
+    """
+    try:
+        vk = cvk._autorize(vk_token)
+        vk_group = cvk._autorize(vk_group_token)
+    except Exception as e:
+        logger.info(f"❌ Ошибка авторизации: {e}")
+        return
+
+    try:
+        groups_dict = cvk._get_groups(urls_filepath)
+    except FileNotFoundError:
+        logger.info(f"❌ Файл {urls_filepath} не найден.")
+        return
+
+    stream_vk_groups(vk, vk_group, groups_dict, output_dir, wait, stop_event)
+
+
+def main():
+    BASE = Path(__file__).resolve().parent.parent
+    RESOURCES_DIR = BASE.joinpath("urls")
+    SCRAPPED_DATA_DIR = BASE.joinpath("scrapped_data")
+
+    load_dotenv()
+
+    # Сервисный ключ доступа (для догрузки постов через wall.get)
+    VK_SERVICE_TOKEN = os.getenv("VK_SERVICE_TOKEN")
+    if VK_SERVICE_TOKEN is None:
+        raise ValueError("❌ В .env файле не задан VK_SERVICE_TOKEN")
+
+    # Ключ доступа сообщества (Bots Long Poll не работает с сервисным ключом)
+    VK_GROUP_TOKEN = os.getenv("VK_GROUP_TOKEN")
+    if VK_GROUP_TOKEN is None:
+        raise ValueError("❌ В .env файле не задан VK_GROUP_TOKEN")
+
+    INPUT_FILE = RESOURCES_DIR.joinpath("vk_urls.json")
+
+    stream_vk_knowledge(
+        VK_SERVICE_TOKEN, VK_GROUP_TOKEN, INPUT_FILE, SCRAPPED_DATA_DIR
+    )
+
+
+if __name__ == "__main__":
+    main()
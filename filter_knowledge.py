@@ -4,6 +4,7 @@ from collections.abc import Callable
 from tqdm import tqdm
 import re
 
+import merge_knowledge as mk
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -77,6 +78,7 @@ def process(input_file: Path, output_file: Path, pipeline: list[Callable]):
                 json_line = json.dumps(item, ensure_ascii=False)
                 f_out.write(json_line + "\n")
 
+    mk.build_index(output_file)
     logger.info(f"После фильтрации осталось {filtered_count} из {total_lines} записей")
 
 
@@ -1,3 +1,13 @@
+import glob
+import hashlib
+import heapq
+import json
+import mmap
+import sys
+import tempfile
+from collections import deque
+from collections.abc import Iterator
+from itertools import groupby
 from pathlib import Path
 from datetime import datetime
 
@@ -46,18 +56,338 @@ def get_latest_files(directory: Path) -> dict[str, Path]:
     return {k: Path(v["path"]) for k, v in latest.items()}
 
 
+def get_snapshot_files(directory: Path) -> list[Path]:
+    """Все снапшоты с датой в имени, от старых к новым"""
+    snapshots = []
+    for file in directory.glob("*.jsonl"):
+        date_str = file.name.split("_")[-1].replace(".jsonl", "")
+        if _is_date(date_str):
+            snapshots.append((date_str, file.name, file))
+
+    return [file for _, _, file in sorted(snapshots)]
+
+
+def content_hash(item: dict) -> str:
+    """Хэш содержимого записи (поле content)"""
+    content = item.get("content") or ""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_index_path(jsonl_path: Path, key_field: str = "url") -> Path:
+    # Суффикс не .jsonl, чтобы индекс не попадал в get_latest_files.
+    # Индексы по разным полям хранятся в разных файлах
+    if key_field == "url":
+        return jsonl_path.with_name(jsonl_path.name + ".idx.json")
+    return jsonl_path.with_name(f"{jsonl_path.name}.{key_field}.idx.json")
+
+
+def get_index_paths(jsonl_path: Path) -> list[Path]:
+    """Все индексы снапшота, по любым полям"""
+    pattern = glob.escape(jsonl_path.name) + ".*idx.json"
+    return list(jsonl_path.parent.glob(pattern))
+
+
+def is_index_stale(jsonl_path: Path, key_field: str = "url") -> bool:
+    """Индекса нет или снапшот был перезаписан после его построения"""
+    index_path = get_index_path(jsonl_path, key_field)
+    return (
+        not index_path.exists()
+        or index_path.stat().st_mtime < jsonl_path.stat().st_mtime
+    )
+
+
+def build_index(jsonl_path: Path, key_field: str = "url") -> Path:
+    """
+    Строит индекс снапшота: для каждой записи сохраняются ключ (значение поля
+    key_field), хэш content, смещение в байтах и длина строки.
+    Индекс пишется рядом с файлом.
+    """
+    entries = []
+    offset = 0
+    with jsonl_path.open("rb") as f:
+        for raw_line in f:
+            length = len(raw_line.rstrip(b"\r\n"))
+            if raw_line.strip():
+                try:
+                    item = json.loads(raw_line)
+                except json.JSONDecodeError:
+                    item = None
+
+                if item is not None:
+                    entries.append(
+                        {
+                            "key": item.get(key_field),
+                            "hash": content_hash(item),
+                            "offset": offset,
+                            "length": length,
+                        }
+                    )
+            offset += len(raw_line)
+
+    index_path = get_index_path(jsonl_path, key_field)
+    with index_path.open("w", encoding="utf-8") as f:
+        index = {"key_field": key_field, "entries": entries}
+        json.dump(index, f, ensure_ascii=False)
+
+    logger.info(f"Построен индекс на {len(entries)} записей: {index_path}")
+    return index_path
+
+
+class Snapshot:
+    """
+    Доступ к записям снапшота через mmap и индекс, без чтения всего файла.
+    Записи ищутся по значению поля key_field (по умолчанию url), если ключ
+    встречается несколько раз, get(key) возвращает последнюю запись.
+    """
+
+    def __init__(self, jsonl_path: Path, key_field: str = "url"):
+        self.path = jsonl_path
+        index_path = get_index_path(jsonl_path, key_field)
+        if is_index_stale(jsonl_path, key_field):
+            build_index(jsonl_path, key_field)
+
+        with index_path.open("r", encoding="utf-8") as f:
+            index = json.load(f)
+
+        self._entries: list[dict] = index["entries"]
+        self._by_key = {e["key"]: e for e in self._entries}
+        self._by_hash = {e["hash"]: e for e in self._entries}
+
+        self._file = jsonl_path.open("rb")
+        # mmap не умеет отображать пустой файл
+        self._mm = None
+        if jsonl_path.stat().st_size > 0:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._by_key
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def _read(self, entry: dict) -> dict:
+        start = entry["offset"]
+        return json.loads(self._mm[start : start + entry["length"]])
+
+    def get(self, key: str) -> dict | None:
+        entry = self._by_key.get(key)
+        if entry is None:
+            return None
+        return self._read(entry)
+
+    def get_by_hash(self, hash_: str) -> dict | None:
+        entry = self._by_hash.get(hash_)
+        if entry is None:
+            return None
+        return self._read(entry)
+
+    def iter_range(self, start: int = 0, stop: int | None = None) -> Iterator[dict]:
+        """Итерирует записи с порядковыми номерами [start, stop)"""
+        for entry in self._entries[start:stop]:
+            yield self._read(entry)
+
+
+def _get_sort_key(item: dict, seq: int) -> tuple[str, int, int]:
+    # seq - порядковый номер записи при чтении снапшотов от старых к новым,
+    # при равной collection_date побеждает запись из более нового снапшота
+    return (item.get("url") or "", item.get("collection_date") or 0, seq)
+
+
+def _iter_records(
+    input_files: list[Path], sizes: dict[Path, int] | None = None
+) -> Iterator[tuple[tuple, str]]:
+    """
+    В файл vklive_scrapped в это время может дописывать vk_stream. Если для
+    файла в sizes уже есть размер, читаем ровно столько байт, иначе
+    записываем туда, сколько байт прочитано. Так повторный проход видит
+    те же записи, что и первый, даже если файл успел вырасти.
+    """
+    seq = 0
+    for file_path in input_files:
+        limit = sizes.get(file_path) if sizes is not None else None
+        consumed = 0
+        with file_path.open("rb") as infile:
+            for raw_line in infile:
+                if limit is not None and consumed >= limit:
+                    break
+                if limit is not None and consumed + len(raw_line) > limit:
+                    # Строка дописана после первого прохода: берем ту же часть
+                    raw_line = raw_line[: limit - consumed]
+                consumed += len(raw_line)
+
+                # Недописанная строка может обрываться посреди символа
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                yield _get_sort_key(item, seq), line
+                seq += 1
+
+        if sizes is not None and limit is None:
+            sizes[file_path] = consumed
+
+
 def merge_jsonl_files(input_files: list[Path], output_path: Path):
+    """
+    Объединяет файлы, оставляя для каждого url одну запись - с наибольшей
+    collection_date (при равенстве - более позднюю). Так правки постов
+    и посты, попавшие и в vk_scrapped, и в vklive_scrapped, не дублируются.
+    """
+    # Первый проход: для каждого url запоминаем (collection_date, seq) победителя
+    latest = {}
+    sizes = {}
+    for key, _ in _iter_records(input_files, sizes):
+        url = key[0]
+        if url and (url not in latest or key[1:] > latest[url]):
+            latest[url] = key[1:]
+
+    # Второй проход: записываем только победителей и записи без url
     with output_path.open("w", encoding="utf-8") as outfile:
-        for file_path in input_files:
-            with file_path.open("r", encoding="utf-8") as infile:
-                for line in infile:
-                    # Проверяем, не пустая ли строка, и записываем
-                    if line.strip():
-                        outfile.write(line.rstrip() + "\n")
+        for key, line in _iter_records(input_files, sizes):
+            url = key[0]
+            if not url or latest.get(url) == key[1:]:
+                outfile.write(line + "\n")
 
+    build_index(output_path)
     logger.info(f"✅ Успешно смерджено {len(input_files)} файлов в: {output_path}")
 
 
+def _get_record_size(record: tuple[tuple, str]) -> int:
+    """
+    Размер записи буфера в памяти: строка, ключ с его элементами, сама пара
+    и указатель на нее в списке. Кириллица в str занимает 2 байта на символ,
+    поэтому считаем через sys.getsizeof, а не по длине строки.
+    """
+    key, line = record
+    return (
+        sys.getsizeof(record)
+        + sys.getsizeof(line)
+        + sys.getsizeof(key)
+        + sum(sys.getsizeof(part) for part in key)
+        + 8
+    )
+
+
+def _spill_run(buffer: list[tuple[tuple, str]], tmp_dir: Path) -> Path:
+    buffer.sort(key=lambda record: record[0])
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=tmp_dir, suffix=".run", delete=False
+    ) as run_file:
+        for key, line in buffer:
+            run_file.write(json.dumps([key, line], ensure_ascii=False) + "\n")
+
+    return Path(run_file.name)
+
+
+def _read_run(run_path: Path) -> Iterator[tuple[tuple, str]]:
+    with run_path.open("r", encoding="utf-8") as run_file:
+        for run_line in run_file:
+            key, line = json.loads(run_line)
+            yield tuple(key), line
+
+
+def _merge_runs(runs: list[Path], tmp_dir: Path) -> Path:
+    """Сливает несколько порций в одну и удаляет исходные"""
+    merged = heapq.merge(*(_read_run(run) for run in runs), key=lambda r: r[0])
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=tmp_dir, suffix=".run", delete=False
+    ) as run_file:
+        for key, line in merged:
+            run_file.write(json.dumps([key, line], ensure_ascii=False) + "\n")
+
+    for run in runs:
+        run.unlink()
+
+    return Path(run_file.name)
+
+
+def external_merge_jsonl_files(
+    input_files: list[Path],
+    output_path: Path,
+    memory_budget: int = 256 * 1024 * 1024,
+    tmp_dir: Path | None = None,
+    max_fan_in: int = 64,
+):
+    """
+    Объединяет снапшоты, оставляя для каждого url запись с наибольшей
+    collection_date. Записи сортируются внешней сортировкой: отсортированные
+    порции размером до memory_budget байт сбрасываются во временные файлы
+    в tmp_dir, затем сливаются k-way слиянием.
+
+    memory_budget ограничивает размер буфера записей в памяти; сверх него
+    расходуется немного памяти на сортировку и буферы открытых файлов.
+    Одновременно открывается не больше max_fan_in порций: если их больше,
+    они предварительно сливаются группами в несколько проходов.
+    """
+    if tmp_dir is not None:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir, prefix="merge_runs_") as runs_dir:
+        runs = []
+        buffer = []
+        buffer_size = 0
+        total_count = 0
+        for key, line in _iter_records(input_files):
+            record = (key, line)
+            buffer.append(record)
+            buffer_size += _get_record_size(record)
+            total_count += 1
+            if buffer_size >= memory_budget:
+                runs.append(_spill_run(buffer, Path(runs_dir)))
+                buffer = []
+                buffer_size = 0
+
+        if buffer:
+            runs.append(_spill_run(buffer, Path(runs_dir)))
+            buffer = []
+
+        logger.info(f"Записей: {total_count}, отсортированных порций: {len(runs)}")
+
+        while len(runs) > max_fan_in:
+            runs = [
+                _merge_runs(runs[i : i + max_fan_in], Path(runs_dir))
+                for i in range(0, len(runs), max_fan_in)
+            ]
+            logger.info(f"Промежуточное слияние, осталось порций: {len(runs)}")
+
+        unique_count = 0
+        merged = heapq.merge(*(_read_run(run) for run in runs), key=lambda r: r[0])
+        with output_path.open("w", encoding="utf-8") as outfile:
+            for url, records in groupby(merged, key=lambda r: r[0][0]):
+                # Записи без url не схлопываем, сохраняем все
+                if not url:
+                    for _, line in records:
+                        outfile.write(line + "\n")
+                    continue
+
+                # Записи одного url отсортированы по collection_date, берем последнюю
+                _, line = deque(records, maxlen=1)[0]
+                outfile.write(line + "\n")
+                unique_count += 1
+
+    build_index(output_path)
+    logger.info(
+        f"✅ Успешно смерджено {len(input_files)} файлов "
+        f"({unique_count} уникальных url) в: {output_path}"
+    )
+
+
 def main():
     BASE = Path(__file__).resolve().parent
     SCRAPPED_DATA_DIR = BASE.joinpath("scrapped_data")
@@ -9,6 +9,7 @@ from crawlers import crawl_nsu_vk_knowledge as cvk
 from crawlers import crawl_nsu_web_knowledge as cweb
 import merge_knowledge as mk
 import filter_knowledge as fk
+import chunk_knowledge as ck
 from utils.logger import get_logger
 
 logger = get_logger("scrapper")
@@ -19,6 +20,10 @@ def delete_files(files: Iterator[Path]) -> None:
         file.unlink()
         logger.info(f"\tУдален: {file}")
 
+        # Вместе со снапшотом удаляем его индексы
+        for index_file in mk.get_index_paths(file):
+            index_file.unlink()
+
 
 def _clear_data_before_crawling(directory: Path) -> None:
     delete_files(directory.rglob("*.jsonl"))
@@ -53,6 +58,24 @@ async def craw_web_data(urls_dir: Path, output_dir: Path, config: dict):
     await cweb.crawl_web_knowledge(url_fname, output_file, cweb.get_configs())
 
 
+def chunk_data(input_file: Path, output_dir: Path, config: dict):
+    output_file = output_dir.joinpath("chunks.jsonl")
+    cache_file = output_dir.joinpath(config["CACHE_DIR"], "chunks_cache.json")
+
+    workers = None
+    if config["WORKERS"] is not None and config["WORKERS"] != "None":
+        workers = int(config["WORKERS"])
+
+    ck.process(
+        input_file,
+        output_file,
+        cache_file,
+        int(config["CHUNK_SIZE"]),
+        int(config["CHUNK_OVERLAP"]),
+        workers,
+    )
+
+
 def run_scrapper():
     BASE = Path(__file__).resolve().parent
     load_dotenv()
@@ -72,11 +95,19 @@ def run_scrapper():
         logger.info("Пропускаем Scrapper")
         return
 
+    # Чанкинг - необязательный этап, выполняется только если указан в config.yaml
+    chunker_config = None
+    if "chunker" in config:
+        chunker_config = default_config["chunker"] | (config["chunker"] or dict())
+
     if config.get("scrapper", None) is None:
         config["scrapper"] = dict()
 
     config = default_config["scrapper"] | config["scrapper"]
 
+    if config["MERGE_MODE"] not in ("latest", "external"):
+        raise ValueError(f"❌ Неизвестный MERGE_MODE: {config['MERGE_MODE']}")
+
     URLS_DIR = BASE.joinpath(config["URLS_DIR"])
     OUTPUT_DIR = BASE.joinpath(config["OUTPUT_DIR"])
 
@@ -90,15 +121,41 @@ def run_scrapper():
     asyncio.run(craw_web_data(URLS_DIR, OUTPUT_DIR, config))
 
     merged_knowledge = OUTPUT_DIR.joinpath("merged_latest_knowledge.jsonl")
-    files_dict = mk.get_latest_files(OUTPUT_DIR)
-
-    mk.merge_jsonl_files(list(files_dict.values()), merged_knowledge)
+    if config["MERGE_MODE"] == "external":
+        # Все снапшоты, для каждого url остается самая свежая запись
+        merged_files = mk.get_snapshot_files(OUTPUT_DIR)
+    else:
+        merged_files = list(mk.get_latest_files(OUTPUT_DIR).values())
+
+    # Старые снапшоты не меняются, их индексы не перестраиваем
+    for file in merged_files:
+        if mk.is_index_stale(file):
+            mk.build_index(file)
+
+    if config["MERGE_MODE"] == "external":
+        mk.external_merge_jsonl_files(
+            merged_files,
+            merged_knowledge,
+            int(config["MERGE_MEMORY_MB"]) * 1024 * 1024,
+            OUTPUT_DIR.joinpath(config["MERGE_TMP_DIR"]),
+        )
+    else:
+        mk.merge_jsonl_files(merged_files, merged_knowledge)
 
     filtered_output = OUTPUT_DIR.joinpath("filtered_merged_latest_knowledge.jsonl")
     fk.process(merged_knowledge, filtered_output, fk.get_pipeline())
+
+    if chunker_config is not None:
+        logger.info("Разбиение записей на чанки...")
+        chunk_data(filtered_output, OUTPUT_DIR, chunker_config)
+
     if not config["SAVE_TEMP_FILES"]:
         logger.info("Удаление временных файлов:")
-        delete_files(iter(list(files_dict.values()) + [merged_knowledge]))
+        # В режиме external снапшоты - это история, их не удаляем
+        temp_files = [merged_knowledge]
+        if config["MERGE_MODE"] != "external":
+            temp_files = merged_files + temp_files
+        delete_files(iter(temp_files))
 
 
 def main():
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+import chunk_knowledge as ck
+
+
+def _write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_chunks_fit_chunk_size_and_overlap():
+    words = [f"слово{i}" for i in range(100)]
+    chunks = ck.split_text(" ".join(words), chunk_size=60, chunk_overlap=15)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    # Ни одно слово не потеряно и не разрезано
+    chunk_words = [chunk.split() for chunk in chunks]
+    assert sorted({w for ws in chunk_words for w in ws}) == sorted(words)
+    # Соседние чанки перекрываются: следующий начинается с хвоста предыдущего
+    for prev, next_ in zip(chunk_words, chunk_words[1:]):
+        assert next_[0] in prev
+
+
+def test_chunks_do_not_cross_headings():
+    text = "# Первый\nкороткий текст\n## Второй\n" + "x" * 250 + "\n# Третий\nеще текст"
+    chunks = ck.split_text(text, chunk_size=100, chunk_overlap=20)
+
+    assert chunks[0] == "# Первый\nкороткий текст"
+    assert chunks[-1] == "# Третий\nеще текст"
+    # Длинная секция режется на несколько чанков, каждый со своим заголовком
+    second = chunks[1:-1]
+    assert len(second) > 1
+    assert all(chunk.startswith("## Второй\n") for chunk in second)
+    assert all(len(chunk) <= 100 for chunk in second)
+    assert "".join(chunk.removeprefix("## Второй\n") for chunk in second) == "x" * 250
+
+
+def test_process_reuses_cache(tmp_path):
+    input_file = tmp_path.joinpath("filtered.jsonl")
+    output_file = tmp_path.joinpath("chunks.jsonl")
+    cache_file = tmp_path.joinpath("cache", "chunks_cache.json")
+    _write_jsonl(
+        input_file,
+        [
+            {"url": "a", "content": "абзац один.\n\n" + "текст " * 50},
+            {"url": "b", "content": "пост вк"},
+        ],
+    )
+
+    ck.process(input_file, output_file, cache_file, 100, 20, workers=1)
+    first_run = _read_jsonl(output_file)
+    cache = json.loads(cache_file.read_text(encoding="utf-8"))
+    assert len(cache) == 2
+
+    # Кэш подменен: если второй запуск возьмет чанки из него, мы это увидим
+    for key in cache:
+        cache[key] = [f"из кэша {chunk}" for chunk in cache[key]]
+    cache_file.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+
+    ck.process(input_file, output_file, cache_file, 100, 20, workers=1)
+    second_run = _read_jsonl(output_file)
+
+    assert [c["chunk_id"] for c in second_run] == [c["chunk_id"] for c in first_run]
+    assert all(c["content"].startswith("из кэша ") for c in second_run)
+    assert len({c["chunk_id"] for c in second_run}) == len(second_run)
+
+
+def test_process_misses_cache_on_changed_params(tmp_path):
+    input_file = tmp_path.joinpath("filtered.jsonl")
+    output_file = tmp_path.joinpath("chunks.jsonl")
+    cache_file = tmp_path.joinpath("chunks_cache.json")
+    _write_jsonl(input_file, [{"url": "a", "content": "текст " * 50}])
+
+    ck.process(input_file, output_file, cache_file, 100, 20, workers=1)
+    first_run = _read_jsonl(output_file)
+    first_key = next(iter(json.loads(cache_file.read_text(encoding="utf-8"))))
+
+    ck.process(input_file, output_file, cache_file, 150, 20, workers=1)
+    second_run = _read_jsonl(output_file)
+    cache = json.loads(cache_file.read_text(encoding="utf-8"))
+
+    # Старый ключ вытеснен из кэша, чанки пересчитаны с новым размером
+    assert first_key not in cache
+    assert len(cache) == 1
+    assert len(second_run) < len(first_run)
+    assert all(len(c["content"]) <= 150 for c in second_run)
+    assert {c["chunk_id"] for c in second_run}.isdisjoint(
+        c["chunk_id"] for c in first_run
+    )
+
+
+@pytest.mark.parametrize(
+    "chunk_size, chunk_overlap", [(100, -5), (0, 0), (-10, 0), (100, 100)]
+)
+def test_process_rejects_invalid_params(tmp_path, chunk_size, chunk_overlap):
+    input_file = tmp_path.joinpath("filtered.jsonl")
+    _write_jsonl(input_file, [{"url": "a", "content": "текст"}])
+
+    with pytest.raises(ValueError):
+        ck.process(
+            input_file,
+            tmp_path.joinpath("chunks.jsonl"),
+            tmp_path.joinpath("chunks_cache.json"),
+            chunk_size,
+            chunk_overlap,
+        )
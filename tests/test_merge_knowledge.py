@@ -0,0 +1,116 @@
+import json
+
+import merge_knowledge as mk
+
+
+def _write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_merge_jsonl_files_keeps_latest_record_per_url(tmp_path):
+    vk_file = tmp_path.joinpath("vk_scrapped_2026-01-01_to_2026-01-02.jsonl")
+    live_file = tmp_path.joinpath("vklive_scrapped_2026-01-02.jsonl")
+    _write_jsonl(
+        vk_file,
+        [
+            {"url": "a", "content": "старый", "collection_date": 1},
+            {"url": "b", "content": "b", "collection_date": 1},
+        ],
+    )
+    _write_jsonl(
+        live_file,
+        [
+            {"url": "a", "content": "новый", "collection_date": 2},
+            {"url": "a", "content": "правка", "collection_date": 3},
+            {"url": "c", "content": "c", "collection_date": 2},
+        ],
+    )
+
+    output = tmp_path.joinpath("merged.jsonl")
+    mk.merge_jsonl_files([vk_file, live_file], output)
+
+    records = {r["url"]: r["content"] for r in _read_jsonl(output)}
+    assert len(_read_jsonl(output)) == 3
+    assert records == {"a": "правка", "b": "b", "c": "c"}
+
+
+def test_external_merge_jsonl_files_with_small_budget(tmp_path):
+    files = []
+    expected = {}
+    for day in range(1, 4):
+        path = tmp_path.joinpath(f"vk_scrapped_2026-01-01_to_2026-01-0{day}.jsonl")
+        records = [
+            {"url": f"u{i % 50}", "content": f"{day}-{i}", "collection_date": i % 7}
+            for i in range(200)
+        ]
+        _write_jsonl(path, records)
+        files.append(path)
+        # Эталон: наибольшая collection_date, при равенстве - более поздняя запись
+        for record in records:
+            best = expected.get(record["url"])
+            if best is None or record["collection_date"] >= best["collection_date"]:
+                expected[record["url"]] = record
+
+    output = tmp_path.joinpath("merged.jsonl")
+    runs_dir = tmp_path.joinpath("tmp")
+    mk.external_merge_jsonl_files(
+        files, output, memory_budget=4096, tmp_dir=runs_dir, max_fan_in=2
+    )
+
+    records = _read_jsonl(output)
+    assert len(records) == len(expected)
+    assert {r["url"]: r for r in records} == expected
+    # Временные порции удалены
+    assert list(runs_dir.iterdir()) == []
+
+
+def test_merge_jsonl_files_ignores_lines_appended_between_passes(
+    tmp_path, monkeypatch
+):
+    live_file = tmp_path.joinpath("vklive_scrapped_2026-01-02.jsonl")
+    _write_jsonl(live_file, [{"url": "a", "content": "a", "collection_date": 1}])
+    # Недописанная строка, оборванная посреди символа: vk_stream еще пишет
+    line_b = '{"url": "b", "content": "пост", "collection_date": 2}\n'.encode()
+    cut = len('{"url": "b", "content": "п'.encode()) + 1
+    with open(live_file, "ab") as f:
+        f.write(line_b[:cut])
+
+    iter_records = mk._iter_records
+    passes = []
+
+    def _iter_and_append(input_files, sizes=None):
+        yield from iter_records(input_files, sizes)
+        passes.append(1)
+        # Между проходами vk_stream дописывает строку и добавляет новый url
+        if len(passes) == 1:
+            with open(live_file, "ab") as f:
+                f.write(line_b[cut:])
+                f.write(b'{"url": "new", "content": "new", "collection_date": 3}\n')
+
+    monkeypatch.setattr(mk, "_iter_records", _iter_and_append)
+
+    output = tmp_path.joinpath("merged.jsonl")
+    mk.merge_jsonl_files([live_file], output)
+
+    assert len(passes) == 2
+    assert [r["url"] for r in _read_jsonl(output)] == ["a"]
+
+
+def test_merge_jsonl_files_keeps_last_line_without_newline(tmp_path):
+    vk_file = tmp_path.joinpath("vk_scrapped_2026-01-01_to_2026-01-02.jsonl")
+    vk_file.write_text(
+        '{"url": "a", "content": "a"}\n{"url": "b", "content": "b"}',
+        encoding="utf-8",
+    )
+
+    output = tmp_path.joinpath("merged.jsonl")
+    mk.merge_jsonl_files([vk_file], output)
+
+    assert [r["url"] for r in _read_jsonl(output)] == ["a", "b"]
@@ -0,0 +1,124 @@
+import json
+import os
+
+import merge_knowledge as mk
+
+
+def _write_lines(path, lines, newline="\n"):
+    with open(path, "wb") as f:
+        for line in lines:
+            f.write((line + newline).encode("utf-8"))
+
+
+def _records(*records):
+    return [json.dumps(r, ensure_ascii=False) for r in records]
+
+
+def test_offsets_with_crlf_and_multibyte_content(tmp_path):
+    path = tmp_path.joinpath("snapshot.jsonl")
+    lines = _records(
+        {"url": "a", "content": "Новосибирский университет 🎓"},
+        {"url": "b", "content": "второй"},
+    )
+    _write_lines(path, lines, newline="\r\n")
+    mk.build_index(path)
+
+    index = json.loads(mk.get_index_path(path).read_text(encoding="utf-8"))
+    first, second = index["entries"]
+    assert first["offset"] == 0
+    assert first["length"] == len(lines[0].encode("utf-8"))
+    assert second["offset"] == len(lines[0].encode("utf-8")) + 2
+
+    with mk.Snapshot(path) as snapshot:
+        assert snapshot.get("a")["content"] == "Новосибирский университет 🎓"
+        assert snapshot.get("b")["content"] == "второй"
+
+
+def test_get_returns_last_record_for_duplicate_key(tmp_path):
+    path = tmp_path.joinpath("snapshot.jsonl")
+    _write_lines(
+        path,
+        _records(
+            {"url": "a", "content": "старый"},
+            {"url": "b", "content": "b"},
+            {"url": "a", "content": "новый"},
+        ),
+    )
+
+    with mk.Snapshot(path) as snapshot:
+        assert len(snapshot) == 3
+        assert snapshot.get("a")["content"] == "новый"
+        assert "b" in snapshot
+        assert snapshot.get("missing") is None
+
+
+def test_get_by_hash_and_iter_range(tmp_path):
+    path = tmp_path.joinpath("snapshot.jsonl")
+    records = [{"url": f"u{i}", "content": f"текст {i}"} for i in range(5)]
+    # Пустые строки и битый JSON в индекс не попадают
+    lines = _records(*records[:2]) + ["", "{broken"] + _records(*records[2:])
+    _write_lines(path, lines)
+
+    with mk.Snapshot(path) as snapshot:
+        assert snapshot.get_by_hash(mk.content_hash(records[3])) == records[3]
+        assert snapshot.get_by_hash("unknown") is None
+
+        assert list(snapshot.iter_range()) == records
+        assert list(snapshot.iter_range(1, 3)) == records[1:3]
+        assert list(snapshot.iter_range(3)) == records[3:]
+        assert list(snapshot.iter_range(4, 100)) == records[4:]
+        assert list(snapshot.iter_range(10)) == []
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path.joinpath("snapshot.jsonl")
+    path.write_bytes(b"")
+
+    with mk.Snapshot(path) as snapshot:
+        assert len(snapshot) == 0
+        assert snapshot.get("a") is None
+        assert list(snapshot.iter_range()) == []
+
+
+def test_index_rebuilt_after_rewrite(tmp_path):
+    path = tmp_path.joinpath("snapshot.jsonl")
+    _write_lines(path, _records({"url": "a", "content": "старый"}))
+    mk.build_index(path)
+    assert not mk.is_index_stale(path)
+
+    _write_lines(
+        path,
+        _records({"url": "b", "content": "x"}, {"url": "a", "content": "новый"}),
+    )
+    # Снапшот перезаписан позже, чем построен индекс
+    snapshot_mtime = path.stat().st_mtime
+    index_path = mk.get_index_path(path)
+    os.utime(index_path, (snapshot_mtime - 10, snapshot_mtime - 10))
+    assert mk.is_index_stale(path)
+
+    with mk.Snapshot(path) as snapshot:
+        assert snapshot.get("a")["content"] == "новый"
+    assert not mk.is_index_stale(path)
+
+
+def test_indexes_by_different_fields_do_not_overwrite_each_other(tmp_path):
+    path = tmp_path.joinpath("chunks.jsonl")
+    _write_lines(
+        path,
+        _records(
+            {"chunk_id": "c1", "url": "a", "content": "1"},
+            {"chunk_id": "c2", "url": "a", "content": "2"},
+        ),
+    )
+    chunk_index = mk.build_index(path, key_field="chunk_id")
+    chunk_index_content = chunk_index.read_text(encoding="utf-8")
+
+    with mk.Snapshot(path) as snapshot:
+        assert snapshot.get("a")["chunk_id"] == "c2"
+    with mk.Snapshot(path, key_field="chunk_id") as snapshot:
+        assert snapshot.get("c1")["content"] == "1"
+
+    assert chunk_index.read_text(encoding="utf-8") == chunk_index_content
+    assert sorted(mk.get_index_paths(path)) == sorted(
+        [mk.get_index_path(path), chunk_index]
+    )
@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from crawlers import stream_nsu_vk_knowledge as svk
+
+GROUP_ID = 5
+
+
+def _post(post_id: int, text: str, date: int = 3000, **fields) -> dict:
+    post = {
+        "id": post_id,
+        "owner_id": -GROUP_ID,
+        "from_id": -GROUP_ID,
+        "post_type": "post",
+        "date": date,
+        "text": text,
+    }
+    post.update(fields)
+    return post
+
+
+# Ответы фейкового Long Poll сервера на запросы a_check по порядку,
+# после них сервер отвечает пустыми updates
+LONG_POLL_RESPONSES = [
+    {
+        "ts": "2",
+        "updates": [
+            {"type": "wall_post_new", "object": _post(10, "new")},
+            {"type": "message_new", "object": {"text": "не пост"}},
+            # Предложенная запись и пост пользователя не попадают в базу,
+            # как и при сборе через wall.get(filter="owner")
+            {
+                "type": "wall_post_new",
+                "object": _post(12, "предложка", post_type="suggest"),
+            },
+            {
+                "type": "wall_post_new",
+                "object": _post(13, "от пользователя", from_id=42),
+            },
+        ],
+    },
+    {"failed": 1, "ts": "5"},
+    {
+        "ts": "6",
+        "updates": [{"type": "wall_post_edit", "object": _post(10, "edited")}],
+    },
+    {"failed": 2},
+]
+
+
+class _FakeLongPollServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FakeLongPollHandler)
+        self.responses = list(LONG_POLL_RESPONSES)
+        self.requests = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class _FakeLongPollHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.responses:
+            body = self.server.responses.pop(0)
+        else:
+            time.sleep(0.05)
+            body = {"ts": "7", "updates": []}
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _FakeVk:
+    """Заменяет VkApiMethod: отвечает на нужные методы API и считает вызовы"""
+
+    def __init__(
+        self, long_poll_url: str, token_group_id: int = GROUP_ID, failures: int = 0
+    ):
+        self.long_poll_url = long_poll_url
+        # id сообщества, которому выдан ключ (groups.getById без параметров)
+        self.token_group_id = token_group_id
+        # Сколько первых вызовов groups.getById завершатся ошибкой сети
+        self.failures = failures
+        self.calls = []
+        self.groups = self
+        self.wall = self
+
+    def getById(self, group_id=None):
+        self.calls.append("groups.getById")
+        if self.failures > 0:
+            self.failures -= 1
+            raise requests.ConnectionError("сеть недоступна")
+        if group_id is None:
+            return {"groups": [{"id": self.token_group_id}]}
+        return {"groups": [{"id": GROUP_ID}]}
+
+    def getLongPollServer(self, group_id):
+        self.calls.append("groups.getLongPollServer")
+        return {"server": self.long_poll_url, "key": "key", "ts": "1"}
+
+    def get(self, domain, count, offset, filter):
+        self.calls.append("wall.get")
+        if offset > 0:
+            return {"items": []}
+        return {
+            "items": [
+                # Старый закрепленный пост не должен останавливать догрузку
+                _post(1, "закреп", date=1, is_pinned=1),
+                _post(11, "missed", date=2000),
+                _post(9, "saved", date=1000),
+            ]
+        }
+
+
+@pytest.fixture
+def long_poll_server():
+    server = _FakeLongPollServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _read_lines(output_dir):
+    lines = []
+    for path in sorted(output_dir.glob("vklive_scrapped_*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(json.loads(line) for line in f)
+    return lines
+
+
+def test_stream_vk_groups(long_poll_server, tmp_path):
+    # До остановки был сохранен пост с датой 1000
+    tmp_path.joinpath("vklive_state.json").write_text(json.dumps({"-5": 1000}))
+
+    vk = _FakeVk(long_poll_server.url)
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=svk.stream_vk_groups,
+        args=(vk, vk, {"Группа": "https://vk.com/group"}, tmp_path),
+        kwargs={"wait": 1, "stop_event": stop_event, "reconnect_delay": 0.01},
+    )
+    thread.start()
+
+    # Ждем, пока сервер отдаст все сценарные ответы и поток переподключится
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if not long_poll_server.responses and vk.calls.count("wall.get") >= 3:
+            break
+        time.sleep(0.05)
+
+    stop_event.set()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+    lines = _read_lines(tmp_path)
+    assert [(line["url"], line["content"]) for line in lines] == [
+        # Догрузка при запуске: только посты новее сохраненного
+        ("https://vk.com/wall-5_11", "missed"),
+        ("https://vk.com/wall-5_10", "new"),
+        ("https://vk.com/wall-5_10", "edited"),
+    ]
+    assert all(line["name"] == "Группа" for line in lines)
+
+    # Догрузка при запуске, после failed=1 и после failed=2
+    assert vk.calls.count("wall.get") >= 3
+    # После failed=2 сервер Long Poll запрашивается заново
+    assert vk.calls.count("groups.getLongPollServer") >= 2
+    # После failed=1 продолжаем с ts, который вернул сервер
+    assert any("ts=5" in path for path in long_poll_server.requests)
+
+    state = json.loads(tmp_path.joinpath("vklive_state.json").read_text())
+    assert state == {"-5": 3000}
+
+
+def test_group_id_lookup_is_retried(long_poll_server, tmp_path):
+    vk = _FakeVk(long_poll_server.url, failures=2)
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=svk.stream_vk_groups,
+        args=(vk, vk, {"Группа": "https://vk.com/group"}, tmp_path),
+        kwargs={"wait": 1, "stop_event": stop_event, "reconnect_delay": 0.01},
+    )
+    thread.start()
+
+    deadline = time.time() + 10
+    while time.time() < deadline and "groups.getLongPollServer" not in vk.calls:
+        time.sleep(0.05)
+
+    stop_event.set()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+    # Две неудачные попытки, затем id группы и id сообщества ключа
+    assert vk.calls[:4] == ["groups.getById"] * 4
+    assert "groups.getLongPollServer" in vk.calls
+
+
+def test_group_of_another_token_is_stopped(long_poll_server, tmp_path):
+    vk = _FakeVk(long_poll_server.url)
+    vk_group = _FakeVk(long_poll_server.url, token_group_id=GROUP_ID + 1)
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=svk.stream_vk_groups,
+        args=(vk, vk_group, {"Группа": "https://vk.com/group"}, tmp_path),
+        kwargs={"wait": 1, "stop_event": stop_event, "reconnect_delay": 0.01},
+    )
+    thread.start()
+
+    # Поток группы завершается сам, без stop_event
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    stop_event.set()
+
+    assert "groups.getLongPollServer" not in vk_group.calls
+    assert long_poll_server.requests == []
+    assert _read_lines(tmp_path) == []